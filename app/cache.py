@@ -0,0 +1,102 @@
+# app/cache.py
+"""
+Small key/value cache used by the services.
+
+Backed by Redis when REDIS_URL is set and the `redis` package is installed,
+otherwise by a bounded in-process dict. Cache failures never propagate:
+a broken Redis simply behaves like a miss.
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from app.config import REDIS_URL
+
+try:
+    import redis
+    _HAS_REDIS = True
+except Exception:
+    _HAS_REDIS = False
+
+_LOCAL_MAXSIZE = 4096
+
+_pool = None
+_local: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+_local_lock = threading.Lock()
+
+
+def get_redis():
+    """Return a Redis client sharing one connection pool, or None if Redis is not configured."""
+    global _pool
+    if not (_HAS_REDIS and REDIS_URL):
+        return None
+    if _pool is None:
+        _pool = redis.ConnectionPool.from_url(REDIS_URL)
+    return redis.Redis(connection_pool=_pool)
+
+
+def cache_get(key: str) -> Optional[str]:
+    r = get_redis()
+    if r is not None:
+        try:
+            val = r.get(key)
+            return val.decode("utf-8") if isinstance(val, bytes) else val
+        except Exception as e:
+            print("Redis get failed:", e)
+            return None
+    with _local_lock:
+        entry = _local.get(key)
+        if entry is None:
+            return None
+        expires_at, val = entry
+        if expires_at < time.monotonic():
+            del _local[key]
+            return None
+        _local.move_to_end(key)
+        return val
+
+
+def cache_set(key: str, value: str, ttl: int) -> None:
+    r = get_redis()
+    if r is not None:
+        try:
+            r.setex(key, ttl, value)
+        except Exception as e:
+            print("Redis set failed:", e)
+        return
+    with _local_lock:
+        _local[key] = (time.monotonic() + ttl, value)
+        _local.move_to_end(key)
+        while len(_local) > _LOCAL_MAXSIZE:
+            _local.popitem(last=False)
+
+
+_counters: dict = {}  # key -> int; local fallback for counter_get / counter_incr (never evicted)
+
+
+def counter_get(key: str) -> int:
+    """Current value of an integer counter (0 if unset)."""
+    r = get_redis()
+    if r is not None:
+        try:
+            return int(r.get(key) or 0)
+        except Exception as e:
+            print("Redis get failed:", e)
+            return 0
+    with _local_lock:
+        return _counters.get(key, 0)
+
+
+def counter_incr(key: str) -> int:
+    """Atomically increment an integer counter and return the new value."""
+    r = get_redis()
+    if r is not None:
+        try:
+            return int(r.incr(key))
+        except Exception as e:
+            print("Redis incr failed:", e)
+            return 0
+    with _local_lock:
+        _counters[key] = _counters.get(key, 0) + 1
+        return _counters[key]
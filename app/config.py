@@ -1,3 +1,31 @@
 # app/config.py
+import os
+from dotenv import load_dotenv
+
+# settings may come from .env, like GEMINI_API_KEY
+load_dotenv()
+
 SQLITE_FILE = "chat.db"
-DATABASE_URL = f"sqlite:///{SQLITE_FILE}"
+DATABASE_URL = f"sqlite+aiosqlite:///{SQLITE_FILE}"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+# Redis is optional; without it caches fall back to a per-process store.
+REDIS_URL = os.getenv("REDIS_URL")
+SENTIMENT_CACHE_TTL = int(os.getenv("SENTIMENT_CACHE_TTL", "86400"))
+ANALYTICS_CACHE_TTL = int(os.getenv("ANALYTICS_CACHE_TTL", "60"))
+MOOD_SUMMARY_CACHE_TTL = int(os.getenv("MOOD_SUMMARY_CACHE_TTL", "3600"))
+
+# int8 ONNX sentiment model (used when `optimum[onnxruntime]` is installed)
+SENT_MODEL_INT8 = os.getenv("SENT_MODEL_INT8", "1") != "0"
+SENT_MODEL_INT8_DIR = os.getenv("SENT_MODEL_INT8_DIR", "./roberta-int8")
+
+# exact-match LLM reply cache (keyed by a hash of the full prompt)
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+
+# semantic LLM reply cache (opt-in; needs sentence-transformers + faiss). Matches on the
+# latest user message within one user's conversation, so it can ignore history context.
+LLM_SEMANTIC_CACHE = os.getenv("LLM_SEMANTIC_CACHE", "0") != "0"
+LLM_SEMANTIC_CACHE_MODEL = os.getenv("LLM_SEMANTIC_CACHE_MODEL", "all-MiniLM-L6-v2")
+LLM_SEMANTIC_CACHE_THRESHOLD = float(os.getenv("LLM_SEMANTIC_CACHE_THRESHOLD", "0.92"))
+LLM_SEMANTIC_CACHE_PATH = os.getenv("LLM_SEMANTIC_CACHE_PATH", "llm_semantic_cache")
@@ -1,12 +1,41 @@
 # app/database.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from app.config import DATABASE_URL
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import declarative_base
+from app.config import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
+engine = create_async_engine(
+    DATABASE_URL, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW
 )
 
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+AsyncSessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
+
+
+# columns added after the first release; create_all() does not alter existing tables
+_ADDED_COLUMNS = {
+    "message_analysis": {"polarity": "FLOAT"},
+}
+
+# indexes replaced by a later definition
+_DROPPED_INDEXES = ["ix_messages_user_created"]
+
+def upgrade_schema(sync_conn):
+    """
+    Bring an existing chat.db up to date (run via conn.run_sync): add missing columns,
+    drop replaced indexes and create indexes that create_all() skips on existing tables.
+    """
+    insp = inspect(sync_conn)
+    for table, columns in _ADDED_COLUMNS.items():
+        if not insp.has_table(table):
+            continue
+        existing = {c["name"] for c in insp.get_columns(table)}
+        for name, ddl_type in columns.items():
+            if name not in existing:
+                sync_conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type}"))
+    for name in _DROPPED_INDEXES:
+        sync_conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
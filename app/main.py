@@ -1,23 +1,60 @@
 # app/main.py
+import asyncio
+import traceback
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from app.database import Base, engine
+from app.database import Base, engine, upgrade_schema
 
 import app.models.user
 import app.models.message
 import app.models.message_analysis
 
-from app.routers import users, chat, analytics, messages
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+from app.config import REDIS_URL
+from app.routers import users, chat, analytics, messages, dashboard
+from app.services.analysis_batcher import analysis_batcher
+from app.services.analysis_service import get_sentiment_pipe
+from app.services import llm_service
+
+
+def _response_cache_backend():
+    if REDIS_URL:
+        from redis import asyncio as aioredis
+        from fastapi_cache.backends.redis import RedisBackend
+        return RedisBackend(aioredis.from_url(REDIS_URL))
+    return InMemoryBackend()
+
 
-app = FastAPI(title="Simplified Chatbot - user_id only")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_schema)
+    FastAPICache.init(_response_cache_backend(), prefix="chatbot")
+    # load the sentiment model now so the first chat doesn't pay for it; if it can't be
+    # loaded, keep serving (analysis degrades to neutral sentiment, as without the warm-up)
+    try:
+        await asyncio.to_thread(get_sentiment_pipe)
+    except Exception as e:
+        print("Sentiment model warm-up failed:", e)
+        traceback.print_exc()
+    yield
+    await analysis_batcher.close()
+    if llm_service.semantic_cache is not None:
+        llm_service.semantic_cache.save()
+    await engine.dispose()
 
-# create all tables
-Base.metadata.create_all(bind=engine)
+app = FastAPI(title="Simplified Chatbot - user_id only", lifespan=lifespan)
 
 # include routers
 app.include_router(users.router)
 app.include_router(chat.router)
 app.include_router(analytics.router)
 app.include_router(messages.router)
+app.include_router(dashboard.router)
 
 @app.get("/")
 def root():
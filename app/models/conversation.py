@@ -1,6 +1,6 @@
 # app/models/conversation.py
-import datetime
 from sqlalchemy import Column, Integer, String, TIMESTAMP, ForeignKey
+from sqlalchemy.sql import func
 from app.database import Base
 
 class Conversation(Base):
@@ -9,4 +9,6 @@ class Conversation(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     title = Column(String, nullable=True)
-    created_at = Column(TIMESTAMP, default=datetime.datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=func.now())
+
+    __mapper_args__ = {"eager_defaults": True}
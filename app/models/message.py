@@ -1,6 +1,6 @@
 # app/models/message.py
-import datetime
-from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, ForeignKey, Index
+from sqlalchemy.sql import func
 from app.database import Base
 
 class Message(Base):
@@ -10,4 +10,13 @@ class Message(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # <-- changed
     sender = Column(String, nullable=False)  # 'user' or 'bot'
     text = Column(Text, nullable=False)
-    created_at = Column(TIMESTAMP, default=datetime.datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=func.now())
+
+    # created_at is rendered as CURRENT_TIMESTAMP inside the INSERT (a SQL default, so it
+    # also applies to databases created before this change); eager_defaults loads it back
+    # on flush because async sessions cannot lazy-load it later
+    __mapper_args__ = {"eager_defaults": True}
+
+# history / mood-trend queries filter by user and read the newest N rows, ordered
+# created_at DESC, id DESC; including id lets the index cover the whole sort
+Index("ix_messages_user_created_id", Message.user_id, Message.created_at.desc(), Message.id.desc())
@@ -1,6 +1,6 @@
 # app/models/user.py
-import datetime
 from sqlalchemy import Column, Integer, String, TIMESTAMP
+from sqlalchemy.sql import func
 from app.database import Base
 
 class User(Base):
@@ -8,4 +8,6 @@ class User(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, nullable=False)
-    created_at = Column(TIMESTAMP, default=datetime.datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=func.now())
+
+    __mapper_args__ = {"eager_defaults": True}
@@ -1,29 +1,78 @@
 # app/routers/chat.py
+import asyncio
+import json
+
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal
 from app.schemas.chat import ChatRequest, ChatResponse
-from app.services.chat_service import process_chat
+from app.services.chat_service import process_chat, stream_chat
 from app.models.message_analysis import MessageAnalysis
+from app.services.analytics_service import invalidate_analytics_cache
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 @router.post("/", response_model=ChatResponse)
-def chat(payload: ChatRequest, db: Session = Depends(get_db)):
-    user_msg_id, bot_msg_id, reply = process_chat(db=db, user_id=payload.user_id, text=payload.text)
+async def chat(payload: ChatRequest, db: AsyncSession = Depends(get_db)):
+    user_msg_id, bot_msg_id, reply = await process_chat(db=db, user_id=payload.user_id, text=payload.text)
+    await invalidate_analytics_cache(payload.user_id)
 
     
-    analysis = db.query(MessageAnalysis).filter(MessageAnalysis.message_id == user_msg_id).first()
+    analysis = (
+        await db.execute(select(MessageAnalysis).where(MessageAnalysis.message_id == user_msg_id))
+    ).scalars().first()
     return ChatResponse(
         user_message_id=user_msg_id,
         bot_message_id=bot_msg_id,
         bot_reply=reply,
         analysis=analysis
     )
+
+# running stream turns; the event loop only keeps weak references to tasks
+_turn_tasks = set()
+
+async def _run_stream_turn(payload: ChatRequest, events: asyncio.Queue):
+    # the request-scoped session from get_db is closed before a streamed body runs,
+    # so the turn owns its own session
+    try:
+        async with AsyncSessionLocal() as db:
+            async for event, data in stream_chat(db=db, user_id=payload.user_id, text=payload.text):
+                if event == "done":
+                    await invalidate_analytics_cache(payload.user_id)
+                events.put_nowait((event, data))
+    finally:
+        events.put_nowait(None)
+
+async def _sse_events(payload: ChatRequest):
+    """
+    Relay the turn's events as SSE. The turn runs in its own task, so a client that
+    disconnects mid-reply only stops the relay: the analysis and bot reply are still stored.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    task = asyncio.create_task(_run_stream_turn(payload, events))
+    _turn_tasks.add(task)
+    task.add_done_callback(_turn_tasks.discard)
+
+    while True:
+        item = await events.get()
+        if item is None:
+            break
+        event, data = item
+        yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    # surface a failed turn to the client
+    await task
+
+@router.post("/stream")
+async def chat_stream(payload: ChatRequest):
+    """
+    Same as POST /chat/ but streams the reply as Server-Sent Events:
+    `token` events carry {"text": chunk}; a final `done` event carries
+    {"user_message_id", "bot_message_id", "bot_reply"}.
+    """
+    return StreamingResponse(_sse_events(payload), media_type="text/event-stream")
@@ -0,0 +1,86 @@
+# app/routers/dashboard.py
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from pydantic import TypeAdapter
+from fastapi_cache.decorator import cache
+from app.config import ANALYTICS_CACHE_TTL
+from app.database import AsyncSessionLocal
+from app.models.user import User
+from app.models.message import Message
+from app.models.message_analysis import MessageAnalysis
+from app.schemas.message import MessageWithAnalysis
+from app.services.analysis_service import polarity_expr
+from app.services.analytics_service import analytics_generation, conversation_sentiment_payload, mood_trend_payload
+
+_messages_adapter = TypeAdapter(List[MessageWithAnalysis])
+
+router = APIRouter(prefix="/dashboard", tags=["Dashboard"], default_response_class=ORJSONResponse)
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def _dashboard_key_builder(func, namespace: str = "", *, request=None, response=None, args=(), kwargs=None) -> str:
+    # shares the per-user analytics generation, so invalidate_analytics_cache retires it after a chat
+    kwargs = kwargs or {}
+    user_id = kwargs.get('user_id')
+    return (
+        f"{namespace}:{user_id}:g{await analytics_generation(user_id)}:{func.__name__}:{kwargs.get('limit', 200)}:"
+        f"{kwargs.get('window', 3)}:{kwargs.get('last_n', 200)}:{int(kwargs.get('summary', True))}"
+    )
+
+@router.get("/user/{user_id}")
+@cache(expire=ANALYTICS_CACHE_TTL, namespace="analytics", key_builder=_dashboard_key_builder)
+async def user_dashboard(
+    user_id: int,
+    limit: Optional[int] = 200,
+    window: int = 3,
+    last_n: int = 200,
+    summary: bool = True,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Everything the UI shows for a user in one round trip:
+    {
+      "user_id": int,
+      "messages": [...],                # same as GET /messages/user/{id}?limit=
+      "conversation_sentiment": float or null,
+      "mood_trend": {...}               # same as GET /analytics/user/{id}/mood_trend
+    }
+    The message list and the mood trend are read with a single SELECT.
+    summary=false skips the LLM mood summary (rule-based text only), for callers
+    that need the history/sentiment quickly.
+    """
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="user not found")
+
+    rows = (
+        await db.execute(
+            select(Message, MessageAnalysis, polarity_expr())
+            .outerjoin(MessageAnalysis, MessageAnalysis.message_id == Message.id)
+            .where(Message.user_id == user_id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(max(limit or 0, last_n))
+        )
+    ).all()
+
+    # rows hold ORM instances, so validate from attributes (pydantic v2 won't coerce them otherwise)
+    messages = jsonable_encoder(
+        _messages_adapter.validate_python(
+            [{"message": m, "analysis": a} for m, a, _ in rows[:limit]], from_attributes=True
+        )
+    )
+    mood_rows = [(m.id, m.created_at, polarity) for m, _, polarity in rows[:last_n]]
+    sentiment = await conversation_sentiment_payload(db, user_id)
+
+    return {
+        "user_id": user_id,
+        "messages": messages,
+        "conversation_sentiment": sentiment["conversation_sentiment"],
+        "mood_trend": await mood_trend_payload(user_id, mood_rows, window, llm_summary=summary),
+    }
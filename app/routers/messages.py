@@ -1,9 +1,10 @@
 # app/routers/messages.py
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from app.database import SessionLocal
+from app.database import AsyncSessionLocal
 from app.models.message import Message
 from app.models.message_analysis import MessageAnalysis
 from app.models.user import User
@@ -11,42 +12,45 @@ from app.schemas.message import MessageOut, MessageAnalysisOut, MessageWithAnaly
 
 router = APIRouter(prefix="/messages", tags=["Messages"])
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 @router.get("/{message_id}/analysis", response_model=MessageAnalysisOut)
-def get_message_analysis(message_id: int, db: Session = Depends(get_db)):
+async def get_message_analysis(message_id: int, db: AsyncSession = Depends(get_db)):
     """
     Return the analysis row for a given message_id.
     404 if message or analysis not found.
     """
-    msg = db.query(Message).filter(Message.id == message_id).first()
+    msg = await db.get(Message, message_id)
     if not msg:
         raise HTTPException(status_code=404, detail="message not found")
 
-    analysis = db.query(MessageAnalysis).filter(MessageAnalysis.message_id == message_id).first()
+    analysis = (
+        await db.execute(select(MessageAnalysis).where(MessageAnalysis.message_id == message_id))
+    ).scalars().first()
     if not analysis:
         raise HTTPException(status_code=404, detail="analysis not found for this message")
     return analysis
 
 @router.get("/user/{user_id}", response_model=List[MessageWithAnalysis])
-def get_user_messages_with_analysis(user_id: int, limit: Optional[int] = 100, db: Session = Depends(get_db)):
+async def get_user_messages_with_analysis(user_id: int, limit: Optional[int] = 100, db: AsyncSession = Depends(get_db)):
     """
     Return the last `limit` messages for a user together with their analysis (if available),
     ordered newest->oldest.
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="user not found")
 
-    messages = db.query(Message).filter(Message.user_id == user_id).order_by(Message.created_at.desc()).limit(limit).all()
-
-    out = []
-    for m in messages:
-        analysis = db.query(MessageAnalysis).filter(MessageAnalysis.message_id == m.id).first()
-        out.append({"message": m, "analysis": analysis})
-    return out
+    rows = (
+        await db.execute(
+            select(Message, MessageAnalysis)
+            .outerjoin(MessageAnalysis, MessageAnalysis.message_id == Message.id)
+            .where(Message.user_id == user_id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(limit)
+        )
+    ).all()
+
+    return [{"message": m, "analysis": analysis} for m, analysis in rows]
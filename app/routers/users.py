@@ -1,26 +1,24 @@
 # app/routers/users.py
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal
 from app.models.user import User
 from app.schemas.user import UserCreate, UserOut
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 @router.post("/", response_model=UserOut)
-def create_user(payload: UserCreate, db: Session = Depends(get_db)):
-    existing = db.query(User).filter(User.username == payload.username).first()
+async def create_user(payload: UserCreate, db: AsyncSession = Depends(get_db)):
+    existing = (await db.execute(select(User).where(User.username == payload.username))).scalars().first()
     if existing:
         return existing
     user = User(username=payload.username)
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
@@ -18,6 +18,7 @@ class MessageAnalysisOut(BaseModel):
     message_id: int
     sentiment_label: Optional[str]
     sentiment_score: Optional[float]
+    polarity: Optional[float] = None
     emotion_label: Optional[str] = None
     emotion_scores: Optional[Dict[str, Any]] = None
     created_at: Optional[datetime]
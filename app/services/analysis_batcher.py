@@ -0,0 +1,77 @@
+# app/services/analysis_batcher.py
+"""
+Micro-batching front end for the sentiment model.
+
+Concurrent chat requests submit their text to a shared asyncio queue; a single
+background worker drains up to MAX_BATCH items (waiting at most MAX_WAIT_MS
+for stragglers) and runs them through the pipeline in one call, off the event loop.
+"""
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.analysis_service import analyze_texts
+
+MAX_BATCH = 16
+MAX_WAIT_MS = 10
+
+
+class AnalysisBatcher:
+    def __init__(self, max_batch: int = MAX_BATCH, max_wait_ms: int = MAX_WAIT_MS):
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def submit(self, text: str) -> Dict[str, Any]:
+        """Queue `text` for analysis and wait for its result dict (see analyze_text)."""
+        self._ensure_worker()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, fut))
+        return await fut
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            texts = [text for text, _ in batch]
+            try:
+                results = await loop.run_in_executor(None, analyze_texts, texts)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, fut), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+
+    async def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+
+analysis_batcher = AnalysisBatcher()
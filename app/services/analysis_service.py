@@ -1,24 +1,70 @@
 # app/services/analysis_service.py
-from typing import Dict, Any, Optional
-from transformers import pipeline
-from sqlalchemy.orm import Session
+from typing import Dict, Any, List, Optional
+from transformers import AutoTokenizer, pipeline
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.message_analysis import MessageAnalysis
 from app.models.message import Message
+from app.cache import cache_get, cache_set
+from app.config import SENTIMENT_CACHE_TTL, SENT_MODEL_INT8, SENT_MODEL_INT8_DIR
+import hashlib
+import json
 import math
+import os
 import traceback
 
+try:
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    _HAS_ORT = True
+except Exception:
+    _HAS_ORT = False
+
 
 SENT_MODEL = "cardiffnlp/twitter-roberta-base-sentiment"  
 
 
 
+_INT8_FILE = "model_quantized.onnx"
+
+def _build_int8_pipe():
+    """
+    Pipeline over a dynamically int8-quantized ONNX export of SENT_MODEL.
+    The export + quantization runs once and is reused from SENT_MODEL_INT8_DIR afterwards.
+    """
+    if not os.path.isfile(os.path.join(SENT_MODEL_INT8_DIR, _INT8_FILE)):
+        model = ORTModelForSequenceClassification.from_pretrained(SENT_MODEL, export=True)
+        quantizer = ORTQuantizer.from_pretrained(model)
+        qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=SENT_MODEL_INT8_DIR, quantization_config=qconfig)
+        AutoTokenizer.from_pretrained(SENT_MODEL).save_pretrained(SENT_MODEL_INT8_DIR)
+    ort_model = ORTModelForSequenceClassification.from_pretrained(SENT_MODEL_INT8_DIR, file_name=_INT8_FILE)
+    tokenizer = AutoTokenizer.from_pretrained(SENT_MODEL_INT8_DIR)
+    return pipeline("text-classification", model=ort_model, tokenizer=tokenizer, return_all_scores=True, truncation=True)
+
 _sentiment_pipe = None
+_sentiment_variant: Optional[str] = None  # "int8" or "fp32", set once the pipeline is built
 def get_sentiment_pipe():
-    global _sentiment_pipe
+    global _sentiment_pipe, _sentiment_variant
     if _sentiment_pipe is None:
-        _sentiment_pipe = pipeline("text-classification", model=SENT_MODEL, return_all_scores=True, truncation=True)
+        if _HAS_ORT and SENT_MODEL_INT8:
+            try:
+                _sentiment_pipe = _build_int8_pipe()
+                _sentiment_variant = "int8"
+            except Exception as e:
+                print("int8 ONNX sentiment model unavailable, using default pipeline:", e)
+                traceback.print_exc()
+        if _sentiment_pipe is None:
+            _sentiment_pipe = pipeline("text-classification", model=SENT_MODEL, return_all_scores=True, truncation=True)
+            _sentiment_variant = "fp32"
     return _sentiment_pipe
 
+def _active_variant() -> str:
+    """Variant of the loaded pipeline, or the configured one if it isn't loaded yet."""
+    if _sentiment_variant is not None:
+        return _sentiment_variant
+    return "int8" if (_HAS_ORT and SENT_MODEL_INT8) else "fp32"
+
 def _prob_to_polarity(scores: Dict[str, float]) -> float:
     """
     Map class probability dict (labels -> prob) to continuous polarity [-1 .. 1].
@@ -45,6 +91,9 @@ _LABEL_MAP = {
     "LABEL_0": "negative",
     "LABEL_1": "neutral",
     "LABEL_2": "positive",
+    "0": "negative",
+    "1": "neutral",
+    "2": "positive",
     "negative": "negative",
     "neutral": "neutral",
     "positive": "positive",
@@ -52,6 +101,7 @@ _LABEL_MAP = {
     "NEUTRAL": "neutral",
     "POSITIVE": "positive",
 }
+_LABEL_MAP_GET = _LABEL_MAP.get
 
 def _normalize_label(raw_label: str) -> str:
     """
@@ -61,25 +111,86 @@ def _normalize_label(raw_label: str) -> str:
     """
     if not raw_label:
         return "neutral"
-    mapped = _LABEL_MAP.get(raw_label)
+    mapped = _LABEL_MAP_GET(raw_label)
     if mapped:
         return mapped
-    if raw_label.isdigit():
-        idx = int(raw_label)
-        if idx == 0:
-            return "negative"
-        if idx == 1:
-            return "neutral"
-        if idx == 2:
-            return "positive"
     rl = raw_label.lower()
-    if "neg" in rl:
-        return "negative"
-    if "pos" in rl:
-        return "positive"
-    if "neu" in rl:
-        return "neutral"
-    return rl  
+    return _LABEL_MAP_GET(rl, rl)
+
+def _sentiment_cache_key(text: str, variant: str) -> str:
+    # fp32 and int8 scores differ slightly, so each variant keeps its own entries
+    digest = hashlib.sha1(f"{SENT_MODEL}|{text}".encode("utf-8")).hexdigest()
+    return f"sent:v1:{variant}:{digest}"
+
+def _scores_to_result(res) -> Dict[str, Any]:
+    """Turn one pipeline output (list of {label, score}) into the analysis dict."""
+    scores = {}
+    for entry in res:
+        raw_label = entry.get("label")
+        score = float(entry.get("score", 0.0))
+        norm_label = _normalize_label(raw_label)
+        scores[norm_label] = scores.get(norm_label, 0.0) + score
+
+
+    ssum = sum(scores.values()) or 1.0
+    for k in list(scores.keys()):
+        scores[k] = float(scores[k] / ssum)
+
+
+    top_label = max(scores.items(), key=lambda x: x[1])[0]
+    top_score = scores[top_label]
+    polarity = _prob_to_polarity(scores) 
+    return {
+        "sentiment_label": top_label,
+        "sentiment_score": float(top_score),
+        "polarity": polarity,
+        "raw_scores": scores
+    }
+
+def _neutral_result() -> Dict[str, Any]:
+    return {
+        "sentiment_label": "neutral",
+        "sentiment_score": 0.5,
+        "polarity": 0.0,
+        "raw_scores": {}
+    }
+
+def analyze_texts(texts: List[str]) -> List[Dict[str, Any]]:
+    """
+    Batched version of analyze_text: cached texts are answered from the cache,
+    the rest go through the model in a single pipeline call.
+    Returns one result dict per input text, in order.
+    """
+    texts = [t[:512] for t in texts]
+    variant = _active_variant()
+    keys = [_sentiment_cache_key(t, variant) for t in texts]
+    results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+    for i, key in enumerate(keys):
+        cached = cache_get(key)
+        if cached:
+            try:
+                results[i] = json.loads(cached)
+            except ValueError:
+                pass
+
+    misses = [i for i, r in enumerate(results) if r is None]
+    if misses:
+        try:
+            pipe = get_sentiment_pipe()
+            outputs = pipe([texts[i] for i in misses], batch_size=len(misses))
+            # the pipeline may have fallen back to fp32 while loading; store under what actually ran
+            if _sentiment_variant != variant:
+                keys = [_sentiment_cache_key(t, _sentiment_variant) for t in texts]
+            for i, res in zip(misses, outputs):
+                result = _scores_to_result(res)
+                cache_set(keys[i], json.dumps(result), SENTIMENT_CACHE_TTL)
+                results[i] = result
+        except Exception as e:
+            print("Sentiment model error:", e)
+            traceback.print_exc()
+            for i in misses:
+                results[i] = _neutral_result()
+    return results
 
 def analyze_text(text: str) -> Dict[str, Any]:
     """
@@ -91,92 +202,60 @@ def analyze_text(text: str) -> Dict[str, Any]:
          raw_scores: raw dict
       }
     This version normalizes model labels like 'LABEL_0' to human names.
+    Results are cached by model + truncated text, so repeated messages skip the model.
+    """
+    return analyze_texts([text])[0]
+
+
+async def store_analysis(db: AsyncSession, message_id: int, data: Dict[str, Any]) -> MessageAnalysis:
+    """
+    Add an analyze_text() result to message_analysis table. Only flushes (assigning the id);
+    committing is left to the caller so it can share the chat turn's transaction.
+    Stores: sentiment_label, sentiment_score (top-class confidence), polarity, emotion_label(None),
+    and emotion_scores. To keep compatibility, polarity is also kept in the emotion_scores JSON.
     """
-    try:
-        pipe = get_sentiment_pipe()
-        res = pipe(text[:512])[0]  
-        scores = {}
-        for entry in res:
-            raw_label = entry.get("label")
-            score = float(entry.get("score", 0.0))
-            norm_label = _normalize_label(raw_label)
-            scores[norm_label] = scores.get(norm_label, 0.0) + score
-
-
-        ssum = sum(scores.values()) or 1.0
-        for k in list(scores.keys()):
-            scores[k] = float(scores[k] / ssum)
-
-
-        top_label = max(scores.items(), key=lambda x: x[1])[0]
-        top_score = scores[top_label]
-        polarity = _prob_to_polarity(scores) 
-        return {
-            "sentiment_label": top_label,
-            "sentiment_score": float(top_score),
-            "polarity": polarity,
-            "raw_scores": scores
-        }
-    except Exception as e:
-        print("Sentiment model error:", e)
-        traceback.print_exc()
-        return {
-            "sentiment_label": "neutral",
-            "sentiment_score": 0.5,
-            "polarity": 0.0,
-            "raw_scores": {}
-        }
-
-
-def analyze_and_store_message(db: Session, message_id: int, text: str):
-    """
-    Analyze the text and store results into message_analysis table.
-    Stores: sentiment_label, sentiment_score (top-class), emotion_label(None), emotion_scores(None),
-    and also stores polarity in sentiment_score field (optional). To keep compatibility,
-    we fill sentiment_score with top-class confidence, and include polarity in emotion_scores JSON for now.
-    """
-    data = analyze_text(text)
     analysis = MessageAnalysis(
         message_id=message_id,
         sentiment_label=data["sentiment_label"].upper() if data.get("sentiment_label") else None,
         sentiment_score=float(data.get("sentiment_score", 0.0)),
+        polarity=float(data.get("polarity") or 0.0),
         emotion_label=None,
         emotion_scores={"polarity": data.get("polarity"), "raw": data.get("raw_scores")}
     )
     db.add(analysis)
-    db.commit()
-    db.refresh(analysis)
+    await db.flush()
     return analysis
 
-def compute_user_conversation_sentiment(db: Session, user_id: int):
+def polarity_expr(label_weight: float = 0.8):
+    """
+    SQL expression for a message_analysis row's polarity: the polarity column, then
+    emotion_scores.polarity (SQLite JSON1) for older rows, falling back to
+    +/-label_weight from sentiment_label, else 0.
+    """
+    return func.coalesce(
+        MessageAnalysis.polarity,
+        func.json_extract(MessageAnalysis.emotion_scores, "$.polarity"),
+        case(
+            (MessageAnalysis.sentiment_label.ilike("%positive%"), label_weight),
+            (MessageAnalysis.sentiment_label.ilike("%negative%"), -label_weight),
+            else_=0.0,
+        ),
+    )
+
+async def compute_user_conversation_sentiment(db: AsyncSession, user_id: int):
     """
     Compute conversation-level sentiment for user:
-    - Aggregate using mean of per-message polarity (from emotion_scores.polarity)
-    - Fall back to mean of sentiment_score if polarity missing.
-    Returns float in [-1..1] or None.
-    """
-    rows = db.query(MessageAnalysis).join(Message, Message.id == MessageAnalysis.message_id).filter(
-        Message.user_id == user_id
-    ).all()
-    if not rows:
-        return None
-    polarities = []
-    for r in rows:
-        ev = None
-        try:
-            ev = r.emotion_scores or {}
-            p = ev.get("polarity") if isinstance(ev, dict) else None
-            if p is None:
-                if r.sentiment_label:
-                    lbl = r.sentiment_label.lower()
-                    p = 1.0 if "positive" in lbl else (-1.0 if "negative" in lbl else 0.0)
-                else:
-                    p = 0.0
-            polarities.append(float(p))
-        except Exception:
-            continue
-    if not polarities:
+    - Aggregate using mean of per-message polarity (polarity column / emotion_scores.polarity)
+    - Fall back to the sentiment label (+1/-1/0) if polarity missing.
+    The mean is computed by the database. Returns float in [-1..1] or None.
+    """
+    avg, count = (
+        await db.execute(
+            select(func.avg(polarity_expr(label_weight=1.0)), func.count(MessageAnalysis.id))
+            .join(Message, Message.id == MessageAnalysis.message_id)
+            .where(Message.user_id == user_id)
+        )
+    ).one()
+    if not count or avg is None:
         return None
-    return float(sum(polarities) / len(polarities))
-
-
+    return float(avg)
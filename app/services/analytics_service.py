@@ -0,0 +1,241 @@
+# app/services/analytics_service.py
+"""
+Conversation analytics shared by the analytics and dashboard routers:
+the per-user cache generation and the sentiment / mood-trend payloads.
+"""
+import asyncio
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import cache_get, cache_set, counter_get, counter_incr
+from app.config import MOOD_SUMMARY_CACHE_TTL
+from app.models.message import Message
+from app.models.message_analysis import MessageAnalysis
+from app.services.analysis_service import polarity_expr
+
+try:
+    from app.services.llm_service import generate_reply as llm_generate_reply
+    _HAS_LLM = True
+except Exception:
+    _HAS_LLM = False
+
+# ---------- response cache generation ----------
+async def analytics_generation(user_id) -> int:
+    """
+    Current analytics cache generation of a user; cached analytics responses embed it
+    in their key. counter_get may be a blocking Redis GET, so it runs in a thread.
+    """
+    return await asyncio.to_thread(counter_get, f"analytics:gen:{user_id}")
+
+async def invalidate_analytics_cache(user_id: int) -> None:
+    """
+    Retire cached analytics responses for a user (call after new messages are stored)
+    by bumping the user's cache generation; old entries simply expire.
+    """
+    try:
+        await asyncio.to_thread(counter_incr, f"analytics:gen:{user_id}")
+    except Exception as e:
+        print("Analytics cache invalidation failed:", e)
+
+# ---------- helpers ----------
+def _moving_average(values: List[float], window: int = 3) -> np.ndarray:
+    """Trailing moving average; the first points average over what is available."""
+    arr = np.asarray(values, dtype=np.float64)
+    n = arr.size
+    if n == 0:
+        return arr
+    w = max(1, window)
+    csum = np.concatenate(([0.0], np.cumsum(arr)))
+    ends = np.arange(1, n + 1)
+    starts = np.maximum(ends - w, 0)
+    return (csum[ends] - csum[starts]) / (ends - starts)
+
+def _linear_regression_slope(xs: List[float], ys: List[float]) -> Optional[float]:
+    n = len(xs)
+    if n < 2:
+        return None
+    x = np.asarray(xs, dtype=np.float64)
+    y = np.asarray(ys, dtype=np.float64)
+    dx = x - x.mean()
+    den = float(np.dot(dx, dx))
+    if den == 0:
+        return None
+    return float(np.dot(dx, y - y.mean()) / den)
+
+def _detect_shift_points(smoothed: np.ndarray, msg_meta: List[Dict[str, Any]], jump: float = 0.5) -> List[Dict[str, Any]]:
+    """
+    One entry per index where the smoothed series crosses zero or moves by >= `jump`.
+    A step that does both is reported once, as "crossed_zero".
+    """
+    if len(smoothed) < 2:
+        return []
+    sm = np.asarray(smoothed, dtype=np.float64)
+    prev, cur = sm[:-1], sm[1:]
+    crossed = ((prev <= 0) & (cur > 0)) | ((prev >= 0) & (cur < 0))
+    jumped = np.abs(cur - prev) >= jump
+    return [
+        {
+            "index": i,
+            "message_id": msg_meta[i]["message_id"],
+            "timestamp": msg_meta[i]["created_at"],
+            "polarity": float(sm[i]),
+            "reason": "crossed_zero" if crossed[i - 1] else "large_jump",
+        }
+        for i in (np.flatnonzero(crossed | jumped) + 1).tolist()
+    ]
+
+def _label_trend(slope: Optional[float], delta: float, thresholds: Dict[str,float] = None) -> str:
+    if thresholds is None:
+        thresholds = {"slope_small": 0.01, "delta_big": 0.25}
+    if slope is None:
+        return "stable"
+    if slope > thresholds["slope_small"] or delta > thresholds["delta_big"]:
+        return "increasing"
+    if slope < -thresholds["slope_small"] or delta < -thresholds["delta_big"]:
+        return "decreasing"
+    return "stable"
+
+def _polarity_to_word(score: Optional[float]) -> str:
+    if score is None:
+        return "Unknown"
+    try:
+        s = float(score)
+    except Exception:
+        return "Unknown"
+    if s <= -0.6:
+        return "Strongly Negative"
+    elif s <= -0.2:
+        return "Negative"
+    elif s < 0.2:
+        return "Neutral"
+    elif s < 0.6:
+        return "Positive"
+    else:
+        return "Strongly Positive"
+
+def _cached_llm_summary(inputs: Dict[str, Any]) -> Optional[str]:
+    """
+    LLM mood summary for the (rounded) trend inputs. The prompt is built only
+    from `inputs`, so identical inputs reuse the cached summary instead of
+    calling the LLM again. Returns None if the LLM fails or returns nothing.
+    """
+    key = "moodsum:v1:" + hashlib.sha1(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+    cached = cache_get(key)
+    if cached:
+        return cached
+    slope = inputs["slope"]
+    prompt = (
+        "You are a helpful assistant that summarizes mood trends.\n\n"
+        f"Inputs:\n- trend: {inputs['trend']}\n- start_mean: {inputs['start_mean']:.2f}\n- end_mean: {inputs['end_mean']:.2f}\n- delta: {inputs['delta']:.2f}\n"
+        f"- slope: {slope if slope is not None else 'N/A'}\n- detected_shifts: {inputs['shift_count']} (reasons: {inputs['shift_reasons']})\n\n"
+        "Write a concise human-friendly summary (2-3 sentences) describing how the user's mood changed across the conversation and suggested next steps for the assistant if any."
+    )
+    try:
+        # prompts differ only in numbers, so semantic matches would reuse the wrong summary
+        llm_resp = llm_generate_reply(history="", user_message=prompt, use_cache=False)
+    except Exception:
+        return None
+    if not (isinstance(llm_resp, str) and llm_resp.strip()):
+        return None
+    summary = llm_resp.strip()
+    cache_set(key, summary, MOOD_SUMMARY_CACHE_TTL)
+    return summary
+
+# ---------- payload builders (shared by the analytics and dashboard routers) ----------
+async def conversation_sentiment_payload(db: AsyncSession, user_id: int) -> Dict[str, Any]:
+    avg, count = (
+        await db.execute(
+            select(func.avg(polarity_expr()), func.count(MessageAnalysis.id))
+            .join(Message, Message.id == MessageAnalysis.message_id)
+            .where(Message.user_id == user_id)
+        )
+    ).one()
+
+    if not count or avg is None:
+        return {"user_id": user_id, "conversation_sentiment": None, "label": "Unknown", "count": 0}
+
+    agg = float(avg)
+    label = _polarity_to_word(agg)
+    return {"user_id": user_id, "conversation_sentiment": agg, "label": label, "count": count}
+
+async def mood_trend_payload(user_id: int, rows, window: int, llm_summary: bool = True) -> Dict[str, Any]:
+    """
+    Build the mood_trend response from (message_id, created_at, polarity) rows, newest first.
+    With llm_summary=False the summary is the plain rule-based text (no LLM call).
+    """
+    if not rows:
+        return {
+            "user_id": user_id,
+            "count": 0,
+            "polarities": [],
+            "smoothed": [],
+            "slope": None,
+            "start_mean": None,
+            "end_mean": None,
+            "delta": None,
+            "trend": "unknown",
+            "shift_points": [],
+            "summary": ""
+        }
+
+    polarities: List[float] = []
+    msg_meta: List[Dict[str, Any]] = []
+
+    for message_id, created_at, polarity in reversed(rows):
+        polarities.append(float(polarity))
+        msg_meta.append({"message_id": message_id, "created_at": created_at.isoformat() if created_at else None})
+
+    smoothed = _moving_average(polarities, window=window)
+    slope = _linear_regression_slope(np.arange(smoothed.size), smoothed)
+
+    # mean of the first / last `window` points (or of all points if there are fewer)
+    k = min(max(1, window), smoothed.size)
+    start_mean = float(smoothed[:k].mean())
+    end_mean = float(smoothed[-k:].mean())
+    delta = end_mean - start_mean
+
+    trend_label = _label_trend(slope, delta)
+
+    shift_points = _detect_shift_points(smoothed, msg_meta)
+
+    result = {
+        "user_id": user_id,
+        "count": len(polarities),
+        "polarities": polarities,
+        "smoothed": smoothed.tolist(),
+        "slope": slope,
+        "start_mean": start_mean,
+        "end_mean": end_mean,
+        "delta": delta,
+        "trend": trend_label,
+        "shift_points": shift_points,
+    }
+
+    simple_summary = f"Conversation mood is {trend_label}. Start mean={start_mean:+.2f}, end mean={end_mean:+.2f}, delta={delta:+.2f}."
+    if shift_points:
+        simple_summary += f" Detected {len(shift_points)} notable shift(s) (examples: {', '.join(sp['reason'] for sp in shift_points[:3])})."
+
+    summary_text = simple_summary
+
+    if _HAS_LLM and llm_summary:
+        llm_text = await asyncio.to_thread(_cached_llm_summary, {
+            "trend": trend_label,
+            "start_mean": round(start_mean, 2),
+            "end_mean": round(end_mean, 2),
+            "delta": round(delta, 2),
+            "slope": round(slope, 3) if slope is not None else None,
+            "shift_count": len(shift_points),
+            "shift_reasons": [sp["reason"] for sp in shift_points[:5]],
+        })
+        if llm_text:
+            summary_text = llm_text
+
+    result["summary"] = summary_text
+    result["summary_label"] = _polarity_to_word(end_mean)
+
+    return result
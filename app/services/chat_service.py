@@ -1,79 +1,148 @@
 # app/services/chat_service.py
+import asyncio
 import traceback
-from typing import Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.message import Message
 from app.models.message_analysis import MessageAnalysis
-from app.services.analysis_service import analyze_and_store_message
-from app.services.llm_service import generate_reply
+from app.services.analysis_batcher import analysis_batcher
+from app.services.analysis_service import store_analysis
+from app.services.llm_service import agenerate_reply, astream_reply
 
 
-def _build_history_text(db: Session, user_id: int, max_messages: int = 12) -> str:
+async def _build_history_text(db: AsyncSession, user_id: int, max_messages: int = 12) -> str:
     """
     Fetch last max_messages (newest->oldest) for this user and return as
     a plain-text transcript oldest->newest with role labels.
     """
-    msgs = (
-        db.query(Message)
-        .filter(Message.user_id == user_id)
-        .order_by(Message.created_at.desc())
-        .limit(max_messages)
-        .all()
-    )
-    msgs = list(reversed(msgs))
-    lines = []
-    for m in msgs:
-        role = "User" if m.sender == "user" else "Assistant"
-        text = (m.text or "").strip()
-        lines.append(f"{role}: {text}")
+    rows = (
+        await db.execute(
+            select(Message.sender, Message.text)
+            .where(Message.user_id == user_id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(max_messages)
+        )
+    ).all()
+    lines = [
+        f"{'User' if sender == 'user' else 'Assistant'}: {(text or '').strip()}"
+        for sender, text in reversed(rows)
+    ]
     return "\n".join(lines)
 
 
-def process_chat(db: Session, user_id: int, text: str) -> Tuple[int, int, str]:
-    """
-    Save user message, analyze it, call the LLM with recent context, save bot reply.
-    Returns: (user_message_id, bot_message_id, bot_reply)
-    """
-    user_msg = Message(user_id=user_id, sender="user", text=text)
-    db.add(user_msg)
-    db.commit()
-    db.refresh(user_msg)
-
-
+async def _analyze(text: str) -> Optional[Dict[str, Any]]:
     try:
-        analyze_and_store_message(db=db, message_id=user_msg.id, text=text)
+        return await analysis_batcher.submit(text)
     except Exception as e:
-        print("Error during analyze_and_store_message:", e)
+        print("Sentiment analysis failed:", e)
         traceback.print_exc()
-        try:
-            fallback = MessageAnalysis(
-                message_id=user_msg.id,
-                sentiment_label="NEUTRAL",
-                sentiment_score=0.5
-            )
-            db.add(fallback)
-            db.commit()
-            db.refresh(fallback)
-            print("Stored fallback analysis for message", user_msg.id)
-        except Exception as ex:
-            print("Failed to store fallback analysis:", ex)
-            traceback.print_exc()
+        return None
 
+
+async def _generate_bot_reply(history_text: str, text: str, user_id: int) -> str:
     try:
-        history_text = _build_history_text(db=db, user_id=user_id, max_messages=12)
-        bot_reply = generate_reply(history=history_text, user_message=text)
+        bot_reply = await agenerate_reply(history=history_text, user_message=text, cache_scope=f"user:{user_id}")
         if bot_reply is None:
             bot_reply = f"(llm-empty) You said: {text}"
     except Exception as e:
         print("LLM generation failed:", e)
         traceback.print_exc()
         bot_reply = f"(llm-error) You said: {text}"
+    return bot_reply
+
+
+async def _save_user_message(db: AsyncSession, user_id: int, text: str) -> Message:
+    user_msg = Message(user_id=user_id, sender="user", text=text)
+    db.add(user_msg)
+    await db.commit()
+    return user_msg
+
+
+async def _finish_turn(db: AsyncSession, user_msg_id: int, user_id: int, data: Optional[Dict[str, Any]], bot_reply: str) -> Message:
+    """
+    Store the analysis (or a neutral fallback) and the bot reply in one commit.
+    Takes ids rather than the user Message: a rollback expires every instance in the
+    session, and reading an expired attribute would lazy-load, which AsyncSession can't.
+    """
+    try:
+        if data is None:
+            raise ValueError("no analysis result")
+        await store_analysis(db=db, message_id=user_msg_id, data=data)
+    except Exception as e:
+        print("Error during message analysis:", e)
+        traceback.print_exc()
+        if data is not None:
+            # the failed flush left the transaction unusable
+            await db.rollback()
+        fallback = MessageAnalysis(
+            message_id=user_msg_id,
+            sentiment_label="NEUTRAL",
+            sentiment_score=0.5
+        )
+        db.add(fallback)
+        print("Using fallback analysis for message", user_msg_id)
 
     bot_msg = Message(user_id=user_id, sender="bot", text=bot_reply)
     db.add(bot_msg)
-    db.commit()
-    db.refresh(bot_msg)
+    try:
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return bot_msg
+
+
+async def process_chat(db: AsyncSession, user_id: int, text: str) -> Tuple[int, int, str]:
+    """
+    Save user message, then analyze it and call the LLM with recent context
+    concurrently, save bot reply.
+    Sentiment inference goes through the shared batcher so concurrent chats share a model call.
+    The user message is committed on its own so it survives a failed turn and no write
+    transaction stays open during the LLM call; analysis and bot reply share one final commit.
+    Returns: (user_message_id, bot_message_id, bot_reply)
+    """
+    user_msg = await _save_user_message(db, user_id, text)
+    user_msg_id = user_msg.id
+
+    history_text = await _build_history_text(db=db, user_id=user_id, max_messages=12)
+    data, bot_reply = await asyncio.gather(
+        _analyze(text),
+        _generate_bot_reply(history_text, text, user_id),
+    )
+
+    bot_msg = await _finish_turn(db, user_msg_id, user_id, data, bot_reply)
+    return user_msg_id, bot_msg.id, bot_reply
+
+
+async def stream_chat(db: AsyncSession, user_id: int, text: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming variant of process_chat. Yields ("token", {"text": chunk}) as the LLM
+    produces the reply, then ("done", {user_message_id, bot_message_id, bot_reply})
+    once the turn is stored. Sentiment analysis runs while the reply streams.
+    """
+    user_msg = await _save_user_message(db, user_id, text)
+    user_msg_id = user_msg.id
+    history_text = await _build_history_text(db=db, user_id=user_id, max_messages=12)
+    analysis_task = asyncio.create_task(_analyze(text))
+
+    parts: List[str] = []
+    try:
+        async for chunk in astream_reply(history=history_text, user_message=text, cache_scope=f"user:{user_id}"):
+            if chunk:
+                parts.append(chunk)
+                yield "token", {"text": chunk}
+    except Exception as e:
+        print("LLM streaming failed:", e)
+        traceback.print_exc()
+        if not parts:
+            fallback = f"(llm-error) You said: {text}"
+            parts.append(fallback)
+            yield "token", {"text": fallback}
 
-    return user_msg.id, bot_msg.id, bot_reply
+    bot_reply = "".join(parts) or f"(llm-empty) You said: {text}"
+    data = await analysis_task
+    bot_msg = await _finish_turn(db, user_msg_id, user_id, data, bot_reply)
+    yield "done", {"user_message_id": user_msg_id, "bot_message_id": bot_msg.id, "bot_reply": bot_reply}
@@ -1,8 +1,20 @@
 # app/services/llm_service.py
 
 import os
+import asyncio
+import hashlib
+import traceback
+from typing import Any, AsyncIterator, Optional, Tuple
 from google import genai
 from dotenv import load_dotenv
+from app.cache import cache_get, cache_set
+from app.config import (
+    LLM_CACHE_TTL,
+    LLM_SEMANTIC_CACHE,
+    LLM_SEMANTIC_CACHE_MODEL,
+    LLM_SEMANTIC_CACHE_THRESHOLD,
+    LLM_SEMANTIC_CACHE_PATH,
+)
 
 # Load environment variables from .env (recommended)
 load_dotenv()
@@ -15,6 +27,17 @@ if not API_KEY:
 
 client = genai.Client(api_key=API_KEY)
 
+# ----- Semantic reply cache (optional) -----
+semantic_cache = None
+if LLM_SEMANTIC_CACHE:
+    try:
+        from app.services.semantic_cache import SemanticCache
+        semantic_cache = SemanticCache(
+            LLM_SEMANTIC_CACHE_MODEL, LLM_SEMANTIC_CACHE_THRESHOLD, path=LLM_SEMANTIC_CACHE_PATH
+        )
+    except Exception as e:
+        print("Semantic LLM cache disabled:", e)
+
 # ----- Prompt Template -----
 BASE_TEMPLATE = """
 You are a helpful AI assistant.
@@ -27,13 +50,83 @@ User: {user_message}
 Reply naturally as the assistant:
 """
 
+# Template split once at import; build_prompt concatenates the pieces instead of re-parsing
+# the format string per call. Output is byte-identical, so cached prompt keys stay valid.
+_PREFIX, _, _rest = BASE_TEMPLATE.partition("{history}")
+_MID, _, _SUFFIX = _rest.partition("{user_message}")
+
+
+def _strip(s: str) -> str:
+    # skip the copy when there's no surrounding whitespace (the common case)
+    if s and (s[0].isspace() or s[-1].isspace()):
+        return s.strip()
+    return s
+
 
 def build_prompt(history: str, user_message: str) -> str:
     """Injects history + user message into template."""
-    return BASE_TEMPLATE.format(history=history.strip(), user_message=user_message.strip())
+    return f"{_PREFIX}{_strip(history)}{_MID}{_strip(user_message)}{_SUFFIX}"
 
 
-def generate_reply(history: str, user_message: str, model: str = "gemini-2.5-flash-lite") -> str:
+def _exact_key(prompt: str, model: str) -> str:
+    return f"llm:v1:{model}:" + hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _semantic_scope(cache_scope: Optional[str], history: str) -> Optional[str]:
+    """
+    Semantic-cache scope for a turn: cache_scope plus a digest of the previous assistant
+    turn in `history`. Short follow-ups ("yes", "why?") embed alike whatever they answer,
+    so they only reuse replies given right after the same assistant message.
+    """
+    if cache_scope is None:
+        return None
+    _, found, last_bot = ("\n" + (history or "")).rpartition("\nAssistant: ")
+    last_bot = last_bot.split("\nUser: ", 1)[0] if found else ""
+    return f"{cache_scope}:" + hashlib.blake2b(_strip(last_bot).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _cached_reply(prompt: str, model: str, user_message: str, cache_scope: Optional[str]) -> Tuple[Optional[str], Any]:
+    """
+    Look the prompt up in the exact-match cache, then in the semantic cache.
+    The semantic cache embeds only the latest user message (the full prompt is dominated
+    by the template and history) and only matches entries from the same cache_scope
+    (see _semantic_scope); it is skipped when no scope is given.
+    Returns (reply or None, embedding to pass to _remember_reply on a miss).
+    """
+    cached = cache_get(_exact_key(prompt, model))
+    if cached:
+        return cached, None
+    if semantic_cache is None or cache_scope is None:
+        return None, None
+    try:
+        emb = semantic_cache.embed(_strip(user_message))
+        return semantic_cache.lookup(emb, model, cache_scope), emb
+    except Exception as e:
+        print("Semantic cache lookup failed:", e)
+        traceback.print_exc()
+        return None, None
+
+
+def _remember_reply(prompt: str, model: str, reply: str, emb: Any, cache_scope: Optional[str]) -> None:
+    if not reply:
+        return
+    cache_set(_exact_key(prompt, model), reply, LLM_CACHE_TTL)
+    if semantic_cache is None or emb is None or cache_scope is None:
+        return
+    try:
+        semantic_cache.add(emb, model, cache_scope, reply)
+    except Exception as e:
+        print("Semantic cache insert failed:", e)
+        traceback.print_exc()
+
+
+def generate_reply(
+    history: str,
+    user_message: str,
+    model: str = "gemini-2.5-flash-lite",
+    use_cache: bool = True,
+    cache_scope: Optional[str] = None,
+) -> str:
     """
     Generate a bot reply using Gemini.
     
@@ -41,14 +134,77 @@ def generate_reply(history: str, user_message: str, model: str = "gemini-2.5-fla
         history (str): Previous chat transcript in plain text form.
         user_message (str): Latest user message.
         model (str): Gemini model name.
+        use_cache (bool): Reuse replies of identical or semantically similar earlier prompts.
+        cache_scope (str, optional): Semantic-cache partition (e.g. "user:42"); similar
+            messages only reuse replies from the same scope that followed the same
+            assistant turn. None disables semantic reuse.
 
     Returns:
         str: Bot's reply.
     """
     prompt = build_prompt(history, user_message)
+    cache_scope = _semantic_scope(cache_scope, history)
+    emb = None
+    if use_cache:
+        cached, emb = _cached_reply(prompt, model, user_message, cache_scope)
+        if cached is not None:
+            return cached
 
     response = client.models.generate_content(
         model=model,
         contents=prompt
     )
-    return getattr(response, "text", "") or ""
+    reply = getattr(response, "text", "") or ""
+    if use_cache:
+        _remember_reply(prompt, model, reply, emb, cache_scope)
+    return reply
+
+
+async def agenerate_reply(
+    history: str, user_message: str, model: str = "gemini-2.5-flash-lite", cache_scope: Optional[str] = None
+) -> str:
+    """
+    Async variant of generate_reply using the Gemini async client, so the
+    request does not hold a worker thread while waiting on the API.
+    """
+    prompt = build_prompt(history, user_message)
+    cache_scope = _semantic_scope(cache_scope, history)
+    cached, emb = await asyncio.to_thread(_cached_reply, prompt, model, user_message, cache_scope)
+    if cached is not None:
+        return cached
+
+    response = await client.aio.models.generate_content(
+        model=model,
+        contents=prompt
+    )
+    reply = getattr(response, "text", "") or ""
+    # Redis write and the periodic FAISS save are blocking
+    await asyncio.to_thread(_remember_reply, prompt, model, reply, emb, cache_scope)
+    return reply
+
+
+async def astream_reply(
+    history: str, user_message: str, model: str = "gemini-2.5-flash-lite", cache_scope: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Stream a bot reply from Gemini, yielding text chunks as they arrive.
+    A cache hit is yielded as a single chunk.
+    """
+    prompt = build_prompt(history, user_message)
+    cache_scope = _semantic_scope(cache_scope, history)
+    cached, emb = await asyncio.to_thread(_cached_reply, prompt, model, user_message, cache_scope)
+    if cached is not None:
+        yield cached
+        return
+
+    stream = await client.aio.models.generate_content_stream(
+        model=model,
+        contents=prompt
+    )
+    parts = []
+    async for chunk in stream:
+        text = getattr(chunk, "text", "") or ""
+        if text:
+            parts.append(text)
+            yield text
+    await asyncio.to_thread(_remember_reply, prompt, model, "".join(parts), emb, cache_scope)
@@ -0,0 +1,75 @@
+# app/services/semantic_cache.py
+"""
+Semantic cache for LLM replies.
+
+User messages are embedded with a small sentence encoder and kept in a
+FAISS inner-product index (embeddings are normalized, so scores are cosine
+similarities). Every entry carries a scope (e.g. one user and the assistant
+turn the message answered), and a new message reuses the reply of a stored
+neighbour from the same scope and LLM model that scores >= threshold instead
+of calling the LLM.
+"""
+import json
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import faiss
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+
+class SemanticCache:
+    def __init__(self, model_name: str, threshold: float, path: Optional[str] = None, persist_every: int = 50):
+        self.encoder = SentenceTransformer(model_name)
+        self.threshold = threshold
+        self.path = path
+        self.persist_every = persist_every
+        self.index = faiss.IndexFlatIP(self.encoder.get_sentence_embedding_dimension())
+        self.entries: List[Tuple[str, str, str]] = []  # (llm model, scope, reply), row-aligned with the index
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        if path and os.path.isfile(path + ".faiss") and os.path.isfile(path + ".json"):
+            self.index = faiss.read_index(path + ".faiss")
+            with open(path + ".json", encoding="utf-8") as f:
+                self.entries = [tuple(e) for e in json.load(f)]
+            if any(len(e) != 3 for e in self.entries):
+                # older files embedded whole prompts without a scope; those entries are unsafe to reuse
+                self.index.reset()
+                self.entries = []
+
+    def embed(self, text: str) -> np.ndarray:
+        return np.asarray(self.encoder.encode([text], normalize_embeddings=True), dtype=np.float32)
+
+    def lookup(self, emb: np.ndarray, model: str, scope: str, k: int = 8) -> Optional[str]:
+        """Reply of the most similar stored message from the same scope and LLM model, if similar enough."""
+        with self._lock:
+            if self.index.ntotal == 0:
+                return None
+            scores, ids = self.index.search(emb, min(k, self.index.ntotal))
+            for score, i in zip(scores[0], ids[0]):
+                if score < self.threshold:
+                    break
+                cached_model, cached_scope, reply = self.entries[i]
+                if cached_model == model and cached_scope == scope:
+                    return reply
+        return None
+
+    def add(self, emb: np.ndarray, model: str, scope: str, reply: str) -> None:
+        with self._lock:
+            self.index.add(emb)
+            self.entries.append((model, scope, reply))
+            self._unsaved += 1
+            if self.path and self._unsaved >= self.persist_every:
+                self._save_locked()
+
+    def save(self) -> None:
+        with self._lock:
+            if self.path and self._unsaved:
+                self._save_locked()
+
+    def _save_locked(self) -> None:
+        faiss.write_index(self.index, self.path + ".faiss")
+        with open(self.path + ".json", "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        self._unsaved = 0
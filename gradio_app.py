@@ -7,86 +7,290 @@ Full Gradio UI for Chatbot with:
  - mood trend chart (raw + smoothed) and human-friendly summary
  - auto-clear + autofocus message box after send
  - dynamic/responsive right-panel (CSS + JS)
- - safe refresh + Interval auto-update (if Gradio supports it)
+ - safe refresh + gr.Timer auto-update with idle backoff
 
 Run:
  python gradio_app.py
 """
 
-import io
+import os
+import json
+import math
+import queue
+import bisect
+import itertools
+import time
+import hashlib
+import inspect
+import threading
+import functools
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import Future
 import gradio as gr
-import matplotlib.pyplot as plt
-from typing import List, Dict, Optional, Any
-from PIL import Image
+import numpy as np
+from typing import TYPE_CHECKING, List, Dict, Optional, Any
+
+if TYPE_CHECKING:
+    from PIL import Image
 
 # ----------------- Config / Endpoints -----------------
 DEFAULT_BACKEND_URL = "http://127.0.0.1:8000"
 USERS_ENDPOINT = "/users/"
-CHAT_ENDPOINT = "/chat/"
+CHAT_STREAM_ENDPOINT = "/chat/stream"
 MESSAGES_ENDPOINT = "/messages/user/{user_id}?limit={limit}"
 SENTIMENT_ENDPOINT = "/analytics/user/{user_id}/sentiment"
 MOOD_TREND_ENDPOINT = "/analytics/user/{user_id}/mood_trend"
+DASHBOARD_ENDPOINT = "/dashboard/user/{user_id}"
+
+MOOD_PLOT_DPI = 90  # 540x315 px; the panel scales it down anyway
+MOOD_FIGURE_POOL_SIZE = 2  # figures reused by concurrent renders (poller + clicks)
+MOOD_FIGURE_WAIT_S = 10.0  # longest a render waits for a pooled figure before failing
+MOOD_SMOOTH_WINDOW = 3  # fallback smoothing window; matches the backend's mood_trend default
+
+RESPONSE_CACHE_TTL = 5.0  # seconds a fetched backend response is reused
+PREFETCH_DEBOUNCE_S = 0.3  # idle typing time before analytics are prefetched (debounced client-side)
+PREFETCH_MAX_INFLIGHT = 2  # background analytics fetches allowed queued/running at once
+PRIORITY_CLICK = 0  # executor priority for user-initiated fetches
+PRIORITY_PREFETCH = 10  # executor priority for speculative prefetches
+MOOD_POLL_MIN_S = 6.0  # Timer tick; poll period while the mood trend keeps changing
+MOOD_POLL_MAX_S = 60.0  # poll period ceiling after repeated unchanged polls
+
+# ----------------- HTTP session -----------------
+# One pooled keep-alive session for all backend calls instead of a new connection per request.
+# Retry covers idempotent requests only (urllib3 default), so chat POSTs are never resent.
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=Retry(total=2, backoff_factor=0.2))
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+# ----------------- Response cache -----------------
+# Requests currently on the wire, keyed like _RESPONSE_CACHE; concurrent callers for the
+# same key wait on the first caller's Future instead of issuing a duplicate request.
+_INFLIGHT: Dict[tuple, Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+class _TTLCache:
+    """
+    Small thread-safe cache of backend GET responses with a per-entry TTL.
+    Each (backend_url, user_id) has a generation bumped by invalidate_user; a fetch
+    that started under an older generation is not stored.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = RESPONSE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: Dict[tuple, tuple] = {}  # key -> (expires_at, value)
+        self._gens: Dict[tuple, int] = {}  # (backend_url, user_id) -> generation
+        self._lock = threading.Lock()
+
+    def generation(self, key: tuple) -> int:
+        with self._lock:
+            return self._gens.get(key[1:3], 0)
+
+    def get(self, key: tuple):
+        """Return (hit, value)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return False, None
+            return True, value
+
+    def set(self, key: tuple, value, gen: Optional[int] = None) -> bool:
+        """Store value; refused (returns False) if the user was invalidated since `gen` was read."""
+        with self._lock:
+            if gen is not None and self._gens.get(key[1:3], 0) != gen:
+                return False
+            if len(self._data) >= self.maxsize:
+                now = time.monotonic()
+                for k in [k for k, (exp, _) in self._data.items() if exp < now]:
+                    del self._data[k]
+                if len(self._data) >= self.maxsize:
+                    self._data.pop(next(iter(self._data)))
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            return True
+
+    def invalidate_user(self, backend_url: str, user_id: int) -> None:
+        """
+        Drop every cached response for this user (keys are (fn, backend_url, user_id, ...)),
+        bump its generation so fetches already on the wire aren't stored, and detach those
+        fetches from _INFLIGHT so later callers start a fresh request instead of joining them.
+        """
+        user = (backend_url, user_id)
+        with self._lock:
+            self._gens[user] = self._gens.get(user, 0) + 1
+            for k in [k for k in self._data if k[1:3] == user]:
+                del self._data[k]
+        with _INFLIGHT_LOCK:
+            for k in [k for k in _INFLIGHT if k[1:3] == user]:
+                del _INFLIGHT[k]
+
+_RESPONSE_CACHE = _TTLCache()
+
+def _ttl_cached(fn):
+    """
+    Memoize a backend GET helper whose first two params are (backend_url, user_id),
+    and collapse concurrent identical calls into one request.
+    """
+    sig = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (fn.__name__,) + tuple(bound.arguments.values())
+        hit, value = _RESPONSE_CACHE.get(key)
+        if hit:
+            return value
+        with _INFLIGHT_LOCK:
+            fut = _INFLIGHT.get(key)
+            owner = fut is None
+            if owner:
+                fut = _INFLIGHT[key] = Future()
+                gen = _RESPONSE_CACHE.generation(key)
+        if not owner:
+            return fut.result()
+        # the first caller fetches on its own thread, so waiting never needs a free executor worker
+        try:
+            value = fn(*args, **kwargs)
+            _RESPONSE_CACHE.set(key, value, gen=gen)
+            fut.set_result(value)
+            return value
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with _INFLIGHT_LOCK:
+                # invalidate_user may already have replaced this entry with a newer fetch
+                if _INFLIGHT.get(key) is fut:
+                    del _INFLIGHT[key]
+    return wrapper
+
+def _payload_hash(payload: Any) -> str:
+    return hashlib.blake2b(json.dumps(payload, sort_keys=True).encode("utf-8"), digest_size=16).hexdigest()
 
 # ----------------- Backend helpers -----------------
 def create_or_get_user(backend_url: str, username: str) -> Dict:
     url = backend_url.rstrip("/") + USERS_ENDPOINT
-    r = requests.post(url, json={"username": username}, timeout=10)
-    r.raise_for_status()
-    return r.json()
-
-def post_chat(backend_url: str, user_id: int, text: str) -> Dict:
-    url = backend_url.rstrip("/") + CHAT_ENDPOINT
-    r = requests.post(url, json={"user_id": user_id, "text": text}, timeout=25)
+    r = SESSION.post(url, json={"username": username}, timeout=10)
     r.raise_for_status()
     return r.json()
 
+def post_chat_stream(backend_url: str, user_id: int, text: str):
+    """Send a chat message to the SSE endpoint; yields (event, data) as the reply streams in."""
+    url = backend_url.rstrip("/") + CHAT_STREAM_ENDPOINT
+    with SESSION.post(url, json={"user_id": user_id, "text": text}, stream=True, timeout=(10, 60)) as r:
+        r.raise_for_status()
+        event = "message"
+        for line in r.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                yield event, json.loads(line[5:])
+                event = "message"
+
+@_ttl_cached
 def fetch_user_messages(backend_url: str, user_id: int, limit: int = 200) -> List[Dict]:
     url = backend_url.rstrip("/") + MESSAGES_ENDPOINT.format(user_id=user_id, limit=limit)
-    r = requests.get(url, timeout=12)
+    r = SESSION.get(url, timeout=12)
     r.raise_for_status()
     return r.json()
 
+@_ttl_cached
 def get_user_sentiment(backend_url: str, user_id: int) -> Optional[float]:
     url = backend_url.rstrip("/") + SENTIMENT_ENDPOINT.format(user_id=user_id)
-    r = requests.get(url, timeout=10)
+    r = SESSION.get(url, timeout=10)
     r.raise_for_status()
     data = r.json()
     return data.get("conversation_sentiment", None)
 
+@_ttl_cached
 def fetch_mood_trend(backend_url: str, user_id: int, window: int = 3, last_n: int = 200) -> Dict[str, Any]:
     url = backend_url.rstrip("/") + MOOD_TREND_ENDPOINT.format(user_id=user_id)
     params = {"window": window, "last_n": last_n}
-    r = requests.get(url, params=params, timeout=20)
+    r = SESSION.get(url, params=params, timeout=20)
+    r.raise_for_status()
+    return r.json()
+
+@_ttl_cached
+def fetch_dashboard(backend_url: str, user_id: int, limit: int = 200, window: int = 3, last_n: int = 200, summary: bool = True) -> Dict[str, Any]:
+    """Messages + conversation sentiment + mood trend in one request:
+    {"messages": [...], "conversation_sentiment": float|None, "mood_trend": {...}}
+    summary=False skips the (possibly slow) LLM mood summary on the backend."""
+    url = backend_url.rstrip("/") + DASHBOARD_ENDPOINT.format(user_id=user_id)
+    params = {"limit": limit, "window": window, "last_n": last_n, "summary": "true" if summary else "false"}
+    r = SESSION.get(url, params=params, timeout=20)
     r.raise_for_status()
     return r.json()
 
 # ----------------- UI helpers -----------------
+_USER_SENDERS = frozenset(("user", "User"))
+_FMT_SCORED = "{}   —   [{} {:.2f}]".format
+_FMT_LABEL = "{}   —   [{}]".format
+
+# (count, newest id, oldest id, analyzed count) -> formatted history. Messages and their
+# analyses don't change once stored, so this fingerprint identifies a history response.
+_HISTORY_CACHE: Dict[tuple, List[Dict]] = {}
+_HISTORY_CACHE_MAX = 32
+
+def _history_fingerprint(items: List[Dict]) -> Optional[tuple]:
+    if not items:
+        return None
+    newest = (items[0].get("message") or {}).get("id")
+    oldest = (items[-1].get("message") or {}).get("id")
+    if newest is None or oldest is None:
+        return None
+    analyzed = sum(1 for item in items if item.get("analysis"))
+    return (len(items), newest, oldest, analyzed)
+
 def build_history_from_messages(messages_with_analysis: List[Dict]) -> List[Dict]:
     """
     Convert server /messages/user/{id} response to Gradio chat format.
     Backend message objects expected: {"message": {...}, "analysis": {...}}
     We show per-message sentiment inline for user messages.
     """
+    key = _history_fingerprint(messages_with_analysis)
+    cached = _HISTORY_CACHE.get(key) if key is not None else None
+    if cached is not None:
+        return list(cached)
+
+    fmt_scored, fmt_label, user_senders = _FMT_SCORED, _FMT_LABEL, _USER_SENDERS
     out = []
-    for item in reversed(messages_with_analysis):
-        m = item.get("message", {})
-        a = item.get("analysis")
-        role = "user" if (m.get("sender") == "user" or m.get("sender") == "User") else "assistant"
+    append = out.append
+    for item in messages_with_analysis[::-1]:
+        m = item.get("message") or {}
         text = (m.get("text") or "").strip()
-        if role == "user":
-            if a:
-                label = a.get("sentiment_label", "NEUTRAL")
-                score = a.get("sentiment_score")
-                if score is not None:
-                    text = f"{text}   —   [{label.upper()} {float(score):.2f}]"
-                else:
-                    text = f"{text}   —   [{label.upper()}]"
-            else:
-                text = f"{text}   —   [PENDING]"
-        out.append({"role": role, "content": text})
+        if m.get("sender") not in user_senders:
+            append({"role": "assistant", "content": text})
+            continue
+        a = item.get("analysis")
+        if not a:
+            text = f"{text}   —   [PENDING]"
+        else:
+            label = (a.get("sentiment_label") or "NEUTRAL").upper()
+            score = a.get("sentiment_score")
+            text = fmt_label(text, label) if score is None else fmt_scored(text, label, float(score))
+        append({"role": "user", "content": text})
+
+    if key is not None:
+        if len(_HISTORY_CACHE) >= _HISTORY_CACHE_MAX:
+            _HISTORY_CACHE.pop(next(iter(_HISTORY_CACHE)), None)
+        _HISTORY_CACHE[key] = out
+        return list(out)
     return out
 
+# Band edges for polarity_to_word: <= -0.6, <= -0.2, < 0.2, < 0.6, rest. The upper two edges
+# are nudged down one ulp so a single left-bisect reproduces the mixed <= / < boundaries.
+_POLARITY_THRESHOLDS = (-0.6, -0.2, math.nextafter(0.2, -math.inf), math.nextafter(0.6, -math.inf))
+_POLARITY_LABELS = ("Strongly Negative", "Negative", "Neutral", "Positive", "Strongly Positive")
+
 def polarity_to_word(score: Optional[float]) -> str:
     """Map numeric polarity [-1..1] to human-friendly label."""
     if score is None:
@@ -95,20 +299,73 @@ def polarity_to_word(score: Optional[float]) -> str:
         s = float(score)
     except Exception:
         return "Unknown"
-    if s <= -0.6:
-        return "Strongly Negative"
-    elif s <= -0.2:
-        return "Negative"
-    elif s < 0.2:
-        return "Neutral"
-    elif s < 0.6:
-        return "Positive"
-    else:
-        return "Strongly Positive"
-
-def plot_mood_trend_image(polarities: List[float], smoothed: List[float], shift_points: List[Dict[str,Any]]):
-    """Produce PNG bytes of the mood trend plot (raw + smoothed + shift markers)."""
-    fig, ax = plt.subplots(figsize=(6,3.5))
+    return _POLARITY_LABELS[bisect.bisect_left(_POLARITY_THRESHOLDS, s)]
+
+def _moving_average(values: List[float], window: int = MOOD_SMOOTH_WINDOW) -> List[float]:
+    """Trailing moving average, same length as `values` (early points average what's available)."""
+    arr = np.asarray(values, dtype=np.float64)
+    n = arr.size
+    if n == 0:
+        return []
+    w = max(1, min(window, n))
+    sums = np.convolve(arr, np.ones(w), mode="full")[:n]
+    return (sums / np.minimum(np.arange(1, n + 1), w)).tolist()
+
+# matplotlib and PIL are imported on first plot, so chat-only sessions never pay for them
+@functools.lru_cache(maxsize=None)
+def _plt():
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    import matplotlib
+    matplotlib.use("Agg")  # headless: render straight to buffers, no GUI backend probing
+    import matplotlib.pyplot as plt
+    return plt
+
+@functools.lru_cache(maxsize=None)
+def _pil_image():
+    from PIL import Image
+    return Image
+
+# Small pool of figures reused across renders; building a new one per call dominated the
+# plot path. Figures are created on demand up to MOOD_FIGURE_POOL_SIZE, after which
+# renders wait for a free one, so concurrent polls and clicks never allocate more.
+_FIG_POOL: "queue.Queue[tuple]" = queue.Queue()
+_fig_pool_lock = threading.Lock()
+_figs_created = 0
+
+def _acquire_figure():
+    global _figs_created
+    try:
+        return _FIG_POOL.get_nowait()
+    except queue.Empty:
+        pass
+    with _fig_pool_lock:
+        if _figs_created < MOOD_FIGURE_POOL_SIZE:
+            # count the figure only once it exists, so a failed creation frees its slot
+            fig_ax = _plt().subplots(figsize=(6,3.5), dpi=MOOD_PLOT_DPI)
+            _figs_created += 1
+            return fig_ax
+    try:
+        return _FIG_POOL.get(timeout=MOOD_FIGURE_WAIT_S)
+    except queue.Empty:
+        raise RuntimeError("no plot figure became free") from None
+
+def plot_mood_trend_pil(polarities: List[float], smoothed: List[float], shift_points: List[Dict[str,Any]]) -> "Image.Image":
+    """Render the mood trend plot (raw + smoothed + shift markers) straight from the canvas buffer."""
+    if not smoothed and polarities:
+        smoothed = _moving_average(polarities)
+    Image = _pil_image()
+    fig, ax = _acquire_figure()
+    try:
+        _draw_mood(fig, ax, polarities, smoothed, shift_points)
+        fig.canvas.draw()
+        w, h = fig.canvas.get_width_height()
+        # convert() copies, so the image stays valid after the pooled figure is redrawn
+        return Image.frombuffer("RGBA", (w, h), fig.canvas.buffer_rgba(), "raw", "RGBA", 0, 1).convert("RGB")
+    finally:
+        _FIG_POOL.put((fig, ax))
+
+def _draw_mood(fig, ax, polarities, smoothed, shift_points) -> None:
+    ax.cla()
     if polarities:
         ax.plot(range(len(polarities)), polarities, label="raw", linewidth=1, alpha=0.7)
     if smoothed:
@@ -124,12 +381,7 @@ def plot_mood_trend_image(polarities: List[float], smoothed: List[float], shift_
     ax.set_title("Mood Trend")
     ax.grid(True, linestyle=':', linewidth=0.5)
     ax.legend()
-    plt.tight_layout()
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", dpi=120)
-    plt.close(fig)
-    buf.seek(0)
-    return buf.read()
+    fig.tight_layout()
 
 # ----------------- Interaction helpers -----------------
 def refresh_sentiment_button(backend_url: Optional[str] = None, logged_in_state: Optional[dict] = None):
@@ -156,6 +408,66 @@ def refresh_sentiment_button(backend_url: Optional[str] = None, logged_in_state:
     return f"{polarity_to_word(conv)} ({conv:+.2f})"
 
 
+# ----------------- Background prefetch -----------------
+class _PriorityExecutor:
+    """
+    Fixed pool of daemon workers fed from a PriorityQueue: lower priority numbers run
+    first, FIFO within a priority. Lets user clicks jump ahead of queued prefetches.
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str):
+        self._queue: "queue.PriorityQueue[tuple]" = queue.PriorityQueue()
+        self._seq = itertools.count()  # tie-breaker; also keeps Futures out of comparisons
+        for i in range(max_workers):
+            threading.Thread(target=self._worker, name=f"{thread_name_prefix}_{i}", daemon=True).start()
+
+    def submit(self, fn, /, *args, priority: int = PRIORITY_CLICK, **kwargs) -> Future:
+        fut: Future = Future()
+        self._queue.put((priority, next(self._seq), fut, fn, args, kwargs))
+        return fut
+
+    def _worker(self) -> None:
+        while True:
+            _, _, fut, fn, args, kwargs = self._queue.get()
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                fut.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                fut.set_exception(e)
+
+_EXECUTOR = _PriorityExecutor(max_workers=4, thread_name_prefix="ui-fetch")
+_prefetch_slots = threading.BoundedSemaphore(PREFETCH_MAX_INFLIGHT)
+
+def _submit_prefetch(fn, *args) -> None:
+    """Queue a low-priority fetch, or drop it if PREFETCH_MAX_INFLIGHT are already pending."""
+    if not _prefetch_slots.acquire(blocking=False):
+        return
+    fut = _EXECUTOR.submit(fn, *args, priority=PRIORITY_PREFETCH)
+    fut.add_done_callback(lambda _: _prefetch_slots.release())
+
+def prefetch_analytics(backend_url: str, logged_in_state):
+    """
+    Hidden prefetch button handler: while the user types, warm the response cache
+    with the mood trend. The page script debounces the clicks, so this
+    only runs after PREFETCH_DEBOUNCE_S without further keystrokes. Returns immediately.
+    """
+    if not backend_url or not logged_in_state or not isinstance(logged_in_state, dict):
+        return
+    user_id = logged_in_state.get("user_id")
+    if user_id is None:
+        return
+    _submit_prefetch(fetch_mood_trend, backend_url, user_id)
+
+
+def _fetch_messages_and_sentiment(backend_url: str, user_id: int, limit: int):
+    """Start both independent reads at once; returns (messages_future, sentiment_future)."""
+    return (
+        _EXECUTOR.submit(fetch_user_messages, backend_url, user_id, limit=limit),
+        _EXECUTOR.submit(get_user_sentiment, backend_url, user_id),
+    )
+
+
 # ----------------- App functions -----------------
 def login(backend_url: str, username: str):
     """Create or fetch user from backend."""
@@ -163,9 +475,24 @@ def login(backend_url: str, username: str):
         return "Enter a username", None
     try:
         user = create_or_get_user(backend_url, username.strip())
-        return f"Logged in as {user.get('username')} (id: {user.get('id')})", {"user_id": user.get("id"), "username": user.get("username")}
     except Exception as e:
         return f"Login failed: {e}", None
+    _warm_user_cache(backend_url, user.get("id"))
+    return f"Logged in as {user.get('username')} (id: {user.get('id')})", {"user_id": user.get("id"), "username": user.get("username")}
+
+def _warm_user_cache(backend_url: str, user_id: Optional[int]) -> None:
+    """
+    Start fetching what the UI shows right after login: the summary-less dashboard
+    load_history reads (history + sentiment) and the mood trend behind Show Mood
+    Trend and the poller. Handlers join the in-flight requests instead of starting their own.
+    """
+    if user_id is None:
+        return
+    try:
+        _EXECUTOR.submit(fetch_dashboard, backend_url, user_id, summary=False, priority=PRIORITY_CLICK)
+        _EXECUTOR.submit(fetch_mood_trend, backend_url, user_id, priority=PRIORITY_PREFETCH)
+    except Exception as e:
+        print("Login prefetch failed:", e)
 
 def load_history(backend_url: str, logged_in_state, limit: int = 200):
     """Load message history and conversation sentiment."""
@@ -175,65 +502,78 @@ def load_history(backend_url: str, logged_in_state, limit: int = 200):
     if user_id is None:
         return [], "Not logged in"
     try:
-        messages = fetch_user_messages(backend_url, user_id, limit=limit)
-        history = build_history_from_messages(messages)
-    except Exception:
-        history = []
-    try:
-        conv_sent = get_user_sentiment(backend_url, user_id)
+        dash = fetch_dashboard(backend_url, user_id, limit=limit, summary=False)
     except Exception:
-        conv_sent = None
+        return [], "Unknown"
+    history = build_history_from_messages(dash.get("messages") or [])
+    conv_sent = dash.get("conversation_sentiment")
     sentiment_text = f"{polarity_to_word(conv_sent)} ({conv_sent:+.2f})" if conv_sent is not None else "Unknown"
     return history, sentiment_text
 
-def send_message(backend_url: str, logged_in_state, message: str, limit: int = 200):
+def send_message(backend_url: str, logged_in_state, message: str, chat_history: Optional[List[Dict]] = None, limit: int = 200):
     """
-    Send message -> rebuild history -> refresh sentiment.
-    Returns (chat_history, sentiment_text, cleared_input)
+    Send message -> stream the reply into the chat -> rebuild history -> refresh sentiment.
+    Generator: yields (chat_history, sentiment_text, cleared_input) so the Chatbot updates
+    token by token while the backend streams the reply.
     """
     if not logged_in_state or not isinstance(logged_in_state, dict):
-        return [], "Not logged in", ""
+        yield [], "Not logged in", ""
+        return
 
     user_id = logged_in_state.get("user_id")
     if not user_id:
-        return [], "Not logged in", ""
+        yield [], "Not logged in", ""
+        return
 
     
     if not message or message.strip() == "":
         try:
-            messages = fetch_user_messages(backend_url, user_id, limit=limit)
-            history = build_history_from_messages(messages)
-            conv_sent = get_user_sentiment(backend_url, user_id)
+            f_msgs, f_sent = _fetch_messages_and_sentiment(backend_url, user_id, limit)
+            history = build_history_from_messages(f_msgs.result())
+            conv_sent = f_sent.result()
             sentiment_text = f"{polarity_to_word(conv_sent)} ({conv_sent:+.2f})" if conv_sent is not None else "Unknown"
-            return history, sentiment_text, ""
+            yield history, sentiment_text, ""
         except Exception as e:
-            return [], f"Refresh failed: {e}", ""
+            yield [], f"Refresh failed: {e}", ""
+        return
+
+    # show the user's message and the growing reply right away
+    partial = list(chat_history or [])
+    partial.append({"role": "user", "content": f"{message.strip()}   —   [PENDING]"})
+    bot_turn = {"role": "assistant", "content": ""}
+    partial.append(bot_turn)
+    yield partial, gr.update(), ""
 
-    
     try:
-        post_chat(backend_url, user_id, message)
+        for event, data in post_chat_stream(backend_url, user_id, message):
+            if event == "token":
+                bot_turn["content"] += data.get("text", "")
+                yield partial, gr.update(), ""
     except Exception as e:
-        
+        _RESPONSE_CACHE.invalidate_user(backend_url, user_id)
         try:
             messages = fetch_user_messages(backend_url, user_id, limit=limit)
             history = build_history_from_messages(messages)
         except Exception:
             history = []
-        return history, f"Send failed: {e}", ""
+        yield history, f"Send failed: {e}", ""
+        return
+    _RESPONSE_CACHE.invalidate_user(backend_url, user_id)
 
     
+    f_msgs, f_sent = _fetch_messages_and_sentiment(backend_url, user_id, limit)
     try:
-        messages = fetch_user_messages(backend_url, user_id, limit=limit)
-        history = build_history_from_messages(messages)
+        history = build_history_from_messages(f_msgs.result())
     except Exception as e:
-        return [], f"Refresh after send failed: {e}", ""
+        yield partial, f"Refresh after send failed: {e}", ""
+        return
 
     try:
-        conv_sent = get_user_sentiment(backend_url, user_id)
+        conv_sent = f_sent.result()
     except Exception:
         conv_sent = None
     sentiment_text = f"{polarity_to_word(conv_sent)} ({conv_sent:+.2f})" if conv_sent is not None else "Unknown"
-    return history, sentiment_text, ""
+    yield history, sentiment_text, ""
 
 def clear_chat():
     """Clear chat UI only."""
@@ -241,7 +581,8 @@ def clear_chat():
 
 def get_and_plot_mood(backend_url: str, logged_in_state, window: int = 3, last_n: int = 200):
     """
-    Fetch mood_trend endpoint and return (PIL.Image, summary_text, sentiment_label_text).
+    Fetch the mood trend and return (PIL.Image, summary_text, sentiment_label_text).
+    Uses the same request as poll_mood_trend, so a click right after a poll is a cache hit.
     """
     if not logged_in_state or not isinstance(logged_in_state, dict):
         return None, "Not logged in", "Unknown"
@@ -253,7 +594,29 @@ def get_and_plot_mood(backend_url: str, logged_in_state, window: int = 3, last_n
         payload = fetch_mood_trend(backend_url, user_id, window=window, last_n=last_n)
     except Exception as e:
         return None, f"Failed to fetch mood trend: {e}", "Unknown"
+    return render_mood(payload)
+
+_LAST_MOOD_HASH: Optional[str] = None
+_LAST_MOOD_RESULT: Optional[tuple] = None
+_mood_render_lock = threading.Lock()
 
+def render_mood(payload: Dict[str, Any]):
+    """
+    Turn a mood_trend payload into (PIL.Image, summary_text, sentiment_label_text).
+    An identical payload to the previous render returns the previous result without re-plotting.
+    """
+    global _LAST_MOOD_HASH, _LAST_MOOD_RESULT
+    h = _payload_hash(payload)
+    with _mood_render_lock:
+        if h == _LAST_MOOD_HASH:
+            return _LAST_MOOD_RESULT
+    result = _render_mood_uncached(payload)
+    if result[0] is not None:
+        with _mood_render_lock:
+            _LAST_MOOD_HASH, _LAST_MOOD_RESULT = h, result
+    return result
+
+def _render_mood_uncached(payload: Dict[str, Any]):
     polarities = payload.get("polarities", []) or []
     smoothed = payload.get("smoothed", []) or []
     shift_points = payload.get("shift_points", []) or []
@@ -262,14 +625,53 @@ def get_and_plot_mood(backend_url: str, logged_in_state, window: int = 3, last_n
     label = polarity_to_word(end_mean)
 
     try:
-        img_bytes = plot_mood_trend_image(polarities, smoothed, shift_points)
-        img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
+        img = plot_mood_trend_pil(polarities, smoothed, shift_points)
     except Exception as e:
         return None, f"Plotting failed: {e}", f"{label} ({end_mean:+.2f})" if end_mean is not None else label
 
     label_text = f"{label} ({end_mean:+.2f})" if end_mean is not None else label
     return img, summary, label_text
 
+def new_poll_state() -> Dict[str, Any]:
+    """Per-session poller state: current period, last fetch time and last payload hash."""
+    return {"interval": MOOD_POLL_MIN_S, "last_run": 0.0, "hash": None}
+
+def reset_mood_poll(poll_state: Optional[dict]):
+    """User activity: poll again on the next tick and fall back to the fastest period."""
+    return new_poll_state()
+
+def poll_mood_trend(backend_url: str, logged_in_state, poll_state: Optional[dict], window: int = 3, last_n: int = 200):
+    """
+    Timer handler: like get_and_plot_mood, but only updates the plot and summary
+    (sentiment_box keeps the conversation sentiment written by load/send/refresh),
+    and leaves them untouched (gr.update()) when the mood payload hasn't changed
+    since the last poll.
+
+    The Timer ticks every MOOD_POLL_MIN_S; ticks that fall inside the session's
+    current period are skipped. Each unchanged poll doubles that period (up to
+    MOOD_POLL_MAX_S) and any change resets it. Returns (image, summary_text, poll_state).
+    """
+    state = dict(poll_state) if isinstance(poll_state, dict) else new_poll_state()
+    if not logged_in_state or not isinstance(logged_in_state, dict) or logged_in_state.get("user_id") is None:
+        return None, "Not logged in", new_poll_state()
+    now = time.time()
+    if now - state["last_run"] < state["interval"]:
+        return gr.update(), gr.update(), state
+    state["last_run"] = now
+    user_id = logged_in_state["user_id"]
+    try:
+        payload = fetch_mood_trend(backend_url, user_id, window=window, last_n=last_n)
+    except Exception as e:
+        return None, f"Failed to fetch mood trend: {e}", state
+    h = _payload_hash(payload)
+    if state["hash"] == h:
+        state["interval"] = min(state["interval"] * 2, MOOD_POLL_MAX_S)
+        return gr.update(), gr.update(), state
+    state["hash"] = h
+    state["interval"] = MOOD_POLL_MIN_S
+    img, summary, _ = render_mood(payload)
+    return img, summary, state
+
 # ----------------- CSS + JS injection for dynamic right panel -----------------
 demo_css_js = gr.HTML(
     """
@@ -348,6 +750,26 @@ demo_css_js = gr.HTML(
     visible=False
 )
 
+# Debounced analytics prefetch. Passed to gr.Blocks(js=/css=) because <script> tags
+# inside gr.HTML are inserted via innerHTML and never run.
+# The trigger button stays in the DOM (hidden by CSS, not visible=False) so it can be clicked.
+PREFETCH_CSS = "#prefetch-trigger { display: none !important; }"
+PREFETCH_JS = """
+() => {
+  function debounce(fn, ms) {
+    let t = null;
+    return (...args) => { clearTimeout(t); t = setTimeout(() => fn(...args), ms); };
+  }
+  const firePrefetch = debounce(() => {
+    const btn = document.querySelector('#prefetch-trigger');
+    if (btn) btn.click();
+  }, __PREFETCH_DEBOUNCE_MS__);
+  document.addEventListener('input', (e) => {
+    if (e.target && e.target.closest && e.target.closest('#message-box')) firePrefetch();
+  }, true);
+}
+""".replace("__PREFETCH_DEBOUNCE_MS__", str(int(PREFETCH_DEBOUNCE_S * 1000)))
+
 
 focus_js = gr.HTML(
     """
@@ -374,7 +796,7 @@ focus_js = gr.HTML(
 )
 
 # ----------------- Build Gradio UI -----------------
-with gr.Blocks(title="Chatbot + Mood Analytics") as demo:
+with gr.Blocks(title="Chatbot + Mood Analytics", css=PREFETCH_CSS, js=PREFETCH_JS) as demo:
     gr.Markdown("## Chatbot with Per-Message Sentiment and Mood Trend Analytics")
     demo_css_js
     focus_js
@@ -388,9 +810,12 @@ with gr.Blocks(title="Chatbot + Mood Analytics") as demo:
             login_status = gr.Text(label="Login status", interactive=False)
 
             logged_in_state = gr.State(value=None)
+            mood_poll_state = gr.State(value=new_poll_state())
 
             chatbot = gr.Chatbot(label="Conversation", height=480)
-            message_box = gr.Textbox(label="Type message", placeholder="Type message", lines=2)
+            message_box = gr.Textbox(label="Type message", placeholder="Type message", lines=2, elem_id="message-box")
+            # hidden via PREFETCH_CSS (not visible=False) so PREFETCH_JS can still click it
+            prefetch_btn = gr.Button("Prefetch", elem_id="prefetch-trigger")
             send_btn = gr.Button("Send")
             load_btn = gr.Button("Load history")
             clear_btn = gr.Button("Clear chat (UI only)")
@@ -433,18 +858,18 @@ with gr.Blocks(title="Chatbot + Mood Analytics") as demo:
             # Safe refresh wiring
             refresh_btn.click(fn=refresh_sentiment_button, inputs=[backend_url, logged_in_state], outputs=[sentiment_box])
 
-            # Interval auto-update if available
-            try:
-                Interval = gr.Interval  # type: ignore
-                interval = Interval(interval=6.0, run_on_load=False)
-                interval.check(fn=get_and_plot_mood, inputs=[backend_url, logged_in_state], outputs=[mood_image, summary_box, sentiment_box])
-            except Exception:
-                pass
+            # Auto-update; poll_mood_trend skips ticks inside the session's current backoff period
+            mood_timer = gr.Timer(MOOD_POLL_MIN_S)
+            mood_timer.tick(
+                fn=poll_mood_trend,
+                inputs=[backend_url, logged_in_state, mood_poll_state],
+                outputs=[mood_image, summary_box, mood_poll_state],
+            )
 
             gr.Markdown(
                 "- Click **Show Mood Trend** to view polarity over time and a short summary.\n"
                 "- Use **Refresh** to update the conversation sentiment label only.\n"
-                "- Auto-refresh will run every 6s if supported."
+                "- Auto-refresh runs every 6s while the mood changes and backs off to 60s when idle."
             )
 
     # --- Re-wire load & send now that sentiment_box exists ---
@@ -453,9 +878,16 @@ with gr.Blocks(title="Chatbot + Mood Analytics") as demo:
     load_btn.click(fn=load_history, inputs=[backend_url, logged_in_state], outputs=[chatbot, sentiment_box])
     logged_in_state.change(fn=load_history, inputs=[backend_url, logged_in_state], outputs=[chatbot, sentiment_box])
 
-    # Send wiring: returns (chat_history, sentiment_text, cleared input)
-    send_btn.click(fn=send_message, inputs=[backend_url, logged_in_state, message_box], outputs=[chatbot, sentiment_box, message_box])
-    message_box.submit(fn=send_message, inputs=[backend_url, logged_in_state, message_box], outputs=[chatbot, sentiment_box, message_box])
+    # Send wiring: yields (chat_history, sentiment_text, cleared input)
+    # send_message is a generator, so the Chatbot streams the reply as it arrives
+    send_btn.click(fn=send_message, inputs=[backend_url, logged_in_state, message_box, chatbot], outputs=[chatbot, sentiment_box, message_box])
+    message_box.submit(fn=send_message, inputs=[backend_url, logged_in_state, message_box, chatbot], outputs=[chatbot, sentiment_box, message_box])
+    # A new message is activity: drop the auto-refresh back to its fastest period
+    send_btn.click(fn=reset_mood_poll, inputs=[mood_poll_state], outputs=[mood_poll_state])
+    message_box.submit(fn=reset_mood_poll, inputs=[mood_poll_state], outputs=[mood_poll_state])
+
+    # Warm the analytics cache in the background while the user is typing
+    prefetch_btn.click(fn=prefetch_analytics, inputs=[backend_url, logged_in_state], outputs=None)
 
     # Also wire show_trend to auto-refresh sentiment_box (already done above)
     # End of UI building
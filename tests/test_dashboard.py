@@ -0,0 +1,53 @@
+# tests/test_dashboard.py
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import Base
+from app.models.message import Message
+from app.models.message_analysis import MessageAnalysis
+from app.models.user import User
+from app.routers import dashboard
+
+
+def test_dashboard_returns_messages_sentiment_and_trend(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    Session = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def seed():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with Session() as db:
+            user = User(username="alice")
+            db.add(user)
+            await db.flush()
+            msg = Message(user_id=user.id, sender="user", text="I love this")
+            db.add(msg)
+            await db.flush()
+            db.add(MessageAnalysis(message_id=msg.id, sentiment_label="POSITIVE", sentiment_score=0.9, polarity=0.9))
+            db.add(Message(user_id=user.id, sender="bot", text="Glad to hear it"))
+            await db.commit()
+            return user.id
+
+    async def override_get_db():
+        async with Session() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(dashboard.router)
+    app.dependency_overrides[dashboard.get_db] = override_get_db
+    FastAPICache.init(InMemoryBackend(), prefix="test")
+
+    with TestClient(app) as client:
+        user_id = client.portal.call(seed)
+        r = client.get(f"/dashboard/user/{user_id}", params={"summary": "false"})
+        client.portal.call(engine.dispose)
+
+    assert r.status_code == 200
+    body = r.json()
+    assert len(body["messages"]) == 2
+    assert body["messages"][-1]["analysis"]["sentiment_label"] == "POSITIVE"
+    assert abs(body["conversation_sentiment"] - 0.9) < 1e-6
+    assert body["mood_trend"]["count"] == 2